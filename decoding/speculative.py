@@ -0,0 +1,204 @@
+# decoding/speculative.py
+
+import time
+import torch
+
+# Optional local dependencies
+try:
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+except Exception:
+    AutoModelForCausalLM = None
+    AutoTokenizer = None
+
+
+class _CachedModel:
+    """
+    Causal LM plus the KV cache for the prefix of the sequence it has already seen.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.cache = None
+        self.forward_passes = 0
+
+    def cached_len(self):
+        return 0 if self.cache is None else self.cache.get_seq_length()
+
+    def rollback(self, length: int):
+        """Drop cached positions at or beyond `length`."""
+        extra = self.cached_len() - length
+        if extra > 0:
+            # Negative values mean "remove this many tokens" on every Cache version
+            self.cache.crop(-extra)
+
+    def logits(self, tokens: torch.Tensor) -> torch.Tensor:
+        """Run the tokens not yet in the cache; return logits for those positions."""
+        # Always feed at least one token so there is a next-token distribution
+        self.rollback(tokens.shape[1] - 1)
+        out = self.model(
+            input_ids=tokens[:, self.cached_len():],
+            past_key_values=self.cache,
+            use_cache=True,
+        )
+        self.cache = out.past_key_values
+        self.forward_passes += 1
+        return out.logits[0].float()
+
+
+def _probs(logits: torch.Tensor, temperature: float) -> torch.Tensor:
+    if temperature <= 0.0:
+        return torch.nn.functional.one_hot(logits.argmax(-1), logits.shape[-1]).float()
+    return torch.softmax(logits / temperature, dim=-1)
+
+
+def _check_lookahead(lookahead: int):
+    if lookahead < 0:
+        raise ValueError(f"lookahead must be >= 0, got {lookahead}")
+
+
+def _sample(probs: torch.Tensor, generator=None) -> int:
+    return int(torch.multinomial(probs, 1, generator=generator))
+
+
+class SpeculativeDecoder:
+    """
+    Draft/verify speculative decoding with a small draft model and a larger target model.
+
+    Each step the draft proposes `lookahead` tokens autoregressively, then the target
+    scores all of them in a single forward pass. Proposals are accepted with
+    probability min(1, p/q) and the first rejected position is resampled from the
+    residual max(0, p - q), so the output follows the target model's distribution
+    exactly (token-for-token identical to target greedy decoding at temperature 0).
+
+    Both models must share a tokenizer. Their output layers may only differ in
+    size by padding rows past the tokenizer's vocabulary. Only batch size 1 is
+    supported.
+    """
+
+    def __init__(self, target_model, draft_model, tokenizer=None, lookahead: int = 4):
+        _check_lookahead(lookahead)
+        self.target = target_model.eval()
+        self.draft = draft_model.eval()
+        self.tokenizer = tokenizer
+        self.lookahead = lookahead
+
+        target_vocab = self.target.get_output_embeddings().weight.shape[0]
+        draft_vocab = self.draft.get_output_embeddings().weight.shape[0]
+        self.vocab_size = min(target_vocab, draft_vocab)
+        if target_vocab != draft_vocab:
+            # Truncating is only safe when the dropped rows are padding, i.e. no real token lives there
+            if tokenizer is None or len(tokenizer) > self.vocab_size:
+                raise ValueError(
+                    f"Target and draft vocab sizes differ ({target_vocab} vs {draft_vocab}) and the extra "
+                    f"rows are not confirmed padding (tokenizer size: "
+                    f"{'unknown' if tokenizer is None else len(tokenizer)}); use models with the same vocabulary."
+                )
+
+    @classmethod
+    def from_pretrained(cls, target_name: str, draft_name: str, lookahead: int = 4, dtype=torch.float32):
+        if AutoModelForCausalLM is None:
+            raise RuntimeError("transformers not installed; install it to use local speculative decoding.")
+        tokenizer = AutoTokenizer.from_pretrained(target_name)
+        target = AutoModelForCausalLM.from_pretrained(target_name, dtype=dtype)
+        draft = AutoModelForCausalLM.from_pretrained(draft_name, dtype=dtype)
+        return cls(target, draft, tokenizer=tokenizer, lookahead=lookahead)
+
+    @torch.inference_mode()
+    def generate(
+        self,
+        input_ids: torch.Tensor,
+        max_new_tokens: int = 200,
+        temperature: float = 0.0,
+        eos_token_id: int | None = None,
+        lookahead: int | None = None,
+        generator: torch.Generator | None = None,
+    ):
+        """
+        input_ids: (1, prompt_len) token ids
+        lookahead: draft tokens proposed per step; 0 is plain decoding of the target model
+
+        Returns (new token ids tensor, stats dict).
+        """
+        lookahead = self.lookahead if lookahead is None else lookahead
+        _check_lookahead(lookahead)
+        if eos_token_id is None and self.tokenizer is not None:
+            eos_token_id = self.tokenizer.eos_token_id
+
+        target = _CachedModel(self.target)
+        draft = _CachedModel(self.draft)
+        tokens = input_ids.to(self.target.device)
+        prompt_len = tokens.shape[1]
+        proposed = accepted = 0
+        start = time.perf_counter()
+
+        while tokens.shape[1] - prompt_len < max_new_tokens:
+            remaining = max_new_tokens - (tokens.shape[1] - prompt_len)
+            k = min(lookahead, remaining - 1)
+
+            # 1) Draft proposes k tokens
+            seq = tokens
+            draft_probs = []
+            for _ in range(k):
+                q = _probs(draft.logits(seq)[-1, : self.vocab_size], temperature)
+                draft_probs.append(q)
+                seq = torch.cat([seq, seq.new_tensor([[_sample(q, generator)]])], dim=1)
+
+            # 2) Target scores the prefix continuation and every proposal in one pass
+            target_probs = _probs(target.logits(seq)[-(k + 1):, : self.vocab_size], temperature)
+
+            # 3) Accept/reject left to right
+            n = tokens.shape[1]
+            new = []
+            for i in range(k):
+                x = int(seq[0, n + i])
+                p, q = target_probs[i], draft_probs[i]
+                if torch.rand(1, generator=generator).item() * q[x] < p[x]:
+                    new.append(x)
+                    continue
+                residual = torch.clamp(p - q, min=0.0)
+                total = residual.sum()
+                new.append(_sample(residual / total if total > 0 else p, generator))
+                break
+            else:
+                # Every proposal accepted: take a bonus token from the target
+                new.append(_sample(target_probs[k], generator))
+
+            proposed += k
+            accepted += len(new) - 1
+            tokens = torch.cat([tokens, tokens.new_tensor([new])], dim=1)
+
+            # Reuse the KV entries for the accepted prefix; drop the rest
+            target.rollback(tokens.shape[1] - 1)
+            draft.rollback(tokens.shape[1] - 1)
+
+            if eos_token_id is not None and eos_token_id in new:
+                break
+
+        out = tokens[0, prompt_len:]
+        if eos_token_id is not None:
+            hits = (out == eos_token_id).nonzero()
+            if len(hits):
+                out = out[: int(hits[0])]
+        out = out[:max_new_tokens]
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            "new_tokens": len(out),
+            "proposed_tokens": proposed,
+            "accepted_tokens": accepted,
+            "acceptance_rate": accepted / proposed if proposed else 0.0,
+            "target_forward_passes": target.forward_passes,
+            "draft_forward_passes": draft.forward_passes,
+            "tokens_per_target_pass": len(out) / max(target.forward_passes, 1),
+            "elapsed_s": elapsed,
+            "tokens_per_s": len(out) / elapsed if elapsed > 0 else 0.0,
+        }
+        return out.cpu(), stats
+
+    def generate_text(self, prompt: str, **kwargs):
+        if self.tokenizer is None:
+            raise RuntimeError("SpeculativeDecoder was built without a tokenizer; pass input_ids to generate().")
+        input_ids = self.tokenizer(prompt, return_tensors="pt").input_ids
+        out, stats = self.generate(input_ids, **kwargs)
+        stats["prompt_tokens"] = input_ids.shape[1]
+        return self.tokenizer.decode(out, skip_special_tokens=True), stats
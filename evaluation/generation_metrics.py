@@ -0,0 +1,377 @@
+# evaluation/generation_metrics.py
+
+import hashlib
+import json
+import os
+import re
+import string
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+from numpy.linalg import norm
+
+# Optional local dependencies
+try:
+    from indexing.chunking import count_tokens
+except Exception:
+    count_tokens = None
+
+PROJECT_ROOT = Path(__file__).parent.parent
+EVAL_FILE = PROJECT_ROOT / "data/eval_queries.json"
+RESULTS_DIR = PROJECT_ROOT / "data/eval_results"
+
+SOURCE_RE = re.compile(r"\[Source (\d+)\]")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
+def normalize_tokens(text: str) -> list:
+    """Lowercase, strip punctuation and articles, split on whitespace."""
+    text = text.lower().translate(str.maketrans("", "", string.punctuation))
+    return [t for t in text.split() if t not in {"a", "an", "the"}]
+
+
+def token_f1(prediction: str, reference: str) -> float:
+    # Citation markers are not answer content
+    pred, ref = normalize_tokens(SOURCE_RE.sub("", prediction)), normalize_tokens(reference)
+    if not pred or not ref:
+        return float(pred == ref)
+    overlap = sum((Counter(pred) & Counter(ref)).values())
+    if overlap == 0:
+        return 0.0
+    precision = overlap / len(pred)
+    recall = overlap / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def citation_coverage(answer: str, num_sources: int) -> dict:
+    """
+    Share of the [Source i] blocks in the prompt that the answer cites.
+    Citations to indices outside 1..num_sources are counted as invalid.
+    Coverage is None only when there are no sources; an empty answer scores 0.0.
+    """
+    if not num_sources:
+        return {"citation_coverage": None, "cited_sources": [], "invalid_citations": 0}
+    cited = {int(i) for i in SOURCE_RE.findall(answer)}
+    valid = {i for i in cited if 1 <= i <= num_sources}
+    return {
+        "citation_coverage": len(valid) / num_sources,
+        "cited_sources": sorted(valid),
+        "invalid_citations": len(cited - valid),
+    }
+
+
+def split_sentences(text: str) -> list:
+    return [s.strip() for s in SENTENCE_RE.split(SOURCE_RE.sub("", text)) if s.strip()]
+
+
+def faithfulness_scores(records: list, embed_fn) -> list:
+    """
+    Embedding-similarity faithfulness proxy: for every answer sentence, the best
+    cosine similarity against the context chunks, averaged over sentences.
+    Records with no chunks score None; an empty answer scores 0.0.
+
+    Unique sentences and chunk texts across all records are embedded in one
+    call; similarities are computed per record, so memory stays linear in the
+    eval-set size.
+    """
+    texts, text_idx = [], {}
+
+    def idx_of(text):
+        if text not in text_idx:
+            text_idx[text] = len(texts)
+            texts.append(text)
+        return text_idx[text]
+
+    rows = []
+    for r in records:
+        if not r["chunks"]:
+            rows.append(None)
+            continue
+        sents = [idx_of(s) for s in split_sentences(r["answer"])]
+        chunks = [idx_of(c["text"]) for c in r["chunks"]]
+        rows.append((sents, chunks))
+
+    if not any(row and row[0] for row in rows):
+        return [None if row is None else 0.0 for row in rows]
+
+    vecs = np.asarray(embed_fn(texts), dtype=np.float32)
+    vecs = vecs / norm(vecs, axis=1, keepdims=True)
+
+    scores = []
+    for row in rows:
+        if row is None:
+            scores.append(None)
+        elif not row[0]:
+            scores.append(0.0)
+        else:
+            sims = vecs[row[0]] @ vecs[row[1]].T
+            scores.append(float(sims.max(axis=1).mean()))
+    return scores
+
+
+def default_embed_fn(texts: list) -> np.ndarray:
+    """Embed texts in batches with the retrieval embedding model (local or remote)."""
+    from indexing.retrieve_chunks import encode_texts
+
+    return encode_texts(texts)
+
+
+def _token_counts(result: dict) -> dict:
+    """
+    Prompt/answer token counts, preferring the generator's own tokenizer.
+    `token_counter` records which counter produced the numbers; only counts
+    from the same counter are comparable.
+    """
+    stats = result.get("stats") or {}
+    if "prompt_tokens" in stats and "new_tokens" in stats:
+        return {
+            "prompt_tokens": stats["prompt_tokens"],
+            "answer_tokens": stats["new_tokens"],
+            "token_counter": "generator",
+        }
+    if count_tokens is not None:
+        return {
+            "prompt_tokens": count_tokens(result["prompt"]),
+            "answer_tokens": count_tokens(result["answer"]),
+            "token_counter": "tiktoken:cl100k_base",
+        }
+    return {
+        "prompt_tokens": len(result["prompt"].split()),
+        "answer_tokens": len(result["answer"].split()),
+        "token_counter": "whitespace",
+    }
+
+
+# -----------------------------
+# Checkpointed runner
+# -----------------------------
+def load_eval_set(path=EVAL_FILE) -> list:
+    """
+    Eval set: JSON list of {"query": str, "reference_answer": str (optional), "id": str (optional)}.
+    Queries without an id are keyed by their position in the list.
+    """
+    fmt = 'a JSON list of {"query": ..., "reference_answer": ...} objects'
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Eval set {path} not found; create it as {fmt}.")
+    with open(path) as f:
+        raw = f.read()
+    if not raw.strip():
+        raise ValueError(f"Eval set {path} is empty; fill it with {fmt}.")
+    items = json.loads(raw)
+    if not isinstance(items, list) or not all(isinstance(i, dict) and "query" in i for i in items):
+        raise ValueError(f"Eval set {path} must be {fmt}.")
+    for i, item in enumerate(items):
+        item.setdefault("id", str(i))
+    return items
+
+
+def run_config(generator, top_k, rerank, rerank_k, gen_kwargs) -> dict:
+    """Settings that change generated answers; results are only comparable within one config."""
+    config = {
+        "model": getattr(generator, "model_name", None),
+        "top_k": top_k,
+        "rerank": rerank,
+        "rerank_k": rerank_k,
+        "gen_kwargs": gen_kwargs,
+    }
+    # Round-trip through JSON so it compares equal to the checkpointed copy
+    return json.loads(json.dumps(config))
+
+
+def checkpoint_path_for(config: dict, results_dir=RESULTS_DIR) -> Path:
+    tag = hashlib.md5(json.dumps(config, sort_keys=True).encode()).hexdigest()[:8]
+    model = (config.get("model") or "model").replace("/", "__")
+    return Path(results_dir) / f"{model}__{tag}.jsonl"
+
+
+def load_checkpoint(path, config: dict | None = None) -> dict:
+    """
+    Load checkpointed records keyed by query id. Raises ValueError if any record
+    was produced with a different run config than `config`.
+    """
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partial last line from an interrupted write
+                    continue
+                if config is not None and rec.get("config") != config:
+                    raise ValueError(
+                        f"Checkpoint {path} was written with config {rec.get('config')}, "
+                        f"not {config}; use a different checkpoint path to compare settings."
+                    )
+                done[rec["id"]] = rec
+    return done
+
+
+def _generate_one(item, generator, retrieve_fn, config, max_concurrency):
+    chunks = retrieve_fn(item["query"], top_k=config["top_k"], rerank=config["rerank"])[: config["rerank_k"]]
+
+    start = time.perf_counter()
+    result = generator.generate(query=item["query"], chunks=chunks, **config["gen_kwargs"])
+    latency = time.perf_counter() - start
+
+    return {
+        "id": item["id"],
+        "query": item["query"],
+        "reference_answer": item.get("reference_answer"),
+        "answer": result["answer"],
+        "chunks": [{"title": c.get("title"), "source": c.get("source"), "text": c["text"]} for c in chunks],
+        "model": result.get("model"),
+        "endpoint": result.get("endpoint"),
+        "latency_s": latency,
+        # Latency is measured while up to this many generations share the host
+        "max_concurrency": max_concurrency,
+        **_token_counts(result),
+        "stats": result.get("stats"),
+        "config": config,
+    }
+
+
+def run_generation_eval(
+    eval_set: list,
+    generator,
+    checkpoint_path=None,
+    retrieve_fn=None,
+    top_k: int = 10,
+    rerank: bool = False,
+    rerank_k: int = 3,
+    max_concurrency: int = 4,
+    **gen_kwargs,
+) -> list:
+    """
+    Run every query through retrieve + generator, appending each result to a
+    JSONL checkpoint as soon as it finishes. Queries already present in the
+    checkpoint are skipped, so an interrupted run resumes where it left off.
+
+    Each record stores the run config (model, retrieval settings, gen_kwargs);
+    the default checkpoint name includes a hash of it, and resuming from a
+    checkpoint written with another config raises ValueError.
+
+    At most `max_concurrency` queries are in flight. Concurrent generations
+    share the host (or one local model), so `latency_s` depends on it; it is
+    stored in every record, and latency comparisons across models need the
+    same value (use 1 for per-query latency). On interrupt, results
+    that already finished are written and queued work is cancelled.
+    Failed queries are reported and left out of the checkpoint so the next
+    run retries them. Returns the raw records in eval-set order.
+    """
+    if retrieve_fn is None:
+        from indexing.retrieve_chunks import retrieve as retrieve_fn
+
+    config = run_config(generator, top_k, rerank, rerank_k, gen_kwargs)
+    if checkpoint_path is None:
+        checkpoint_path = checkpoint_path_for(config)
+
+    Path(checkpoint_path).parent.mkdir(parents=True, exist_ok=True)
+    done = load_checkpoint(checkpoint_path, config)
+    todo = [item for item in eval_set if item["id"] not in done]
+    print(f"[INFO] {len(done)} queries checkpointed, {len(todo)} to run -> {checkpoint_path}")
+    todo = iter(todo)
+
+    with open(checkpoint_path, "a") as out:
+        # Terminate a partial line left by an interrupted write
+        if out.tell() > 0:
+            with open(checkpoint_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n")
+
+        def save(fut, item):
+            try:
+                rec = fut.result()
+            except Exception as e:
+                print(f"[WARN] query {item['id']} failed: {e}")
+                return
+            out.write(json.dumps(rec) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            done[rec["id"]] = rec
+
+        pool = ThreadPoolExecutor(max_workers=max_concurrency)
+        pending = {}
+
+        def submit_next():
+            item = next(todo, None)
+            if item is not None:
+                pending[pool.submit(_generate_one, item, generator, retrieve_fn, config, max_concurrency)] = item
+
+        try:
+            for _ in range(max_concurrency):
+                submit_next()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    save(fut, pending.pop(fut))
+                    submit_next()
+        finally:
+            # Keep anything that finished before an interrupt, drop the rest
+            for fut, item in pending.items():
+                if fut.done() and not fut.cancelled():
+                    save(fut, item)
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return [done[item["id"]] for item in eval_set if item["id"] in done]
+
+
+def score_results(records: list, embed_fn=default_embed_fn) -> list:
+    """Attach token F1, citation coverage and faithfulness to each record."""
+    faith = faithfulness_scores(records, embed_fn)
+    for rec, f in zip(records, faith):
+        ref = rec.get("reference_answer")
+        rec["token_f1"] = token_f1(rec["answer"], ref) if ref else None
+        rec.update(citation_coverage(rec["answer"], len(rec["chunks"])))
+        rec["faithfulness"] = f
+    return records
+
+
+def summarize(records: list) -> dict:
+    """Aggregate quality and cost over scored records."""
+    def mean(key):
+        vals = [r[key] for r in records if r.get(key) is not None]
+        return float(np.mean(vals)) if vals else None
+
+    latencies = np.array([r["latency_s"] for r in records]) if records else np.zeros(0)
+    return {
+        "num_queries": len(records),
+        # Latencies are only comparable across runs with the same concurrency
+        "max_concurrency": sorted({r["max_concurrency"] for r in records if r.get("max_concurrency") is not None}),
+        "token_counters": sorted({r.get("token_counter") for r in records if r.get("token_counter")}),
+        "token_f1": mean("token_f1"),
+        "citation_coverage": mean("citation_coverage"),
+        "faithfulness": mean("faithfulness"),
+        "latency_mean_s": float(latencies.mean()) if len(latencies) else None,
+        "latency_p95_s": float(np.percentile(latencies, 95)) if len(latencies) else None,
+        "prompt_tokens_mean": mean("prompt_tokens"),
+        "answer_tokens_mean": mean("answer_tokens"),
+        "prompt_tokens_total": int(sum(r["prompt_tokens"] for r in records)),
+        "answer_tokens_total": int(sum(r["answer_tokens"] for r in records)),
+    }
+
+
+# -----------------------------
+# Example usage
+# -----------------------------
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from generation.generate_answer import RAGGenerator
+
+    load_dotenv()
+    model_name = os.environ.get("EVAL_MODEL", "tiiuae/falcon-7b-instruct")
+    rag = RAGGenerator(model_name, os.environ.get("HF_HUB_TOKEN"))
+
+    records = run_generation_eval(load_eval_set(), rag, max_new_tokens=200, temperature=0.0)
+    records = score_results(records)
+    print(json.dumps(summarize(records), indent=2))
@@ -104,3 +104,50 @@ class RAGGenerator:
             "model": self.model_name,
             "endpoint": endpoint,
         }
+
+
+class LocalRAGGenerator:
+    """
+    RAG generator that runs locally on CPU with speculative decoding.
+
+    A small draft model proposes tokens that the target model verifies in
+    batches, so answers match the target model's own decoding at lower
+    per-token latency. Returns the same fields as RAGGenerator plus `stats`.
+    """
+
+    def __init__(self, model_name: str, draft_model_name: str, lookahead: int = 4):
+        # Imported lazily so the remote-only path does not require torch/transformers
+        from decoding.speculative import SpeculativeDecoder
+
+        self.model_name = model_name
+        self.draft_model_name = draft_model_name
+        self.decoder = SpeculativeDecoder.from_pretrained(model_name, draft_model_name, lookahead=lookahead)
+
+    def generate(
+        self,
+        query: str,
+        chunks: list,
+        max_new_tokens: int = 200,
+        temperature: float = 0.0,
+    ):
+        context = format_chunks(chunks)
+
+        prompt = RAG_PROMPT.format(
+            context=context,
+            question=query
+        )
+
+        answer, stats = self.decoder.generate_text(
+            prompt,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+        )
+
+        return {
+            "prompt": prompt,
+            "answer": answer.strip(),
+            "chunks": chunks,
+            "model": self.model_name,
+            "endpoint": "local_speculative",
+            "stats": stats,
+        }
@@ -0,0 +1,186 @@
+import atexit
+import os
+import time
+import numpy as np
+from numpy.linalg import norm
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+
+def top_k_indices(scores: np.ndarray, top_k: int, ids: np.ndarray | None = None) -> np.ndarray:
+    """Return positions of the top_k highest scores, best first.
+
+    Ties are broken by ascending id (row index when ids is None), so the same
+    rows come back no matter how the matrix was partitioned.
+    """
+    scores = np.asarray(scores).ravel()
+    ids = np.arange(len(scores)) if ids is None else np.asarray(ids)
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Keep everything tied with the k-th best score so tie-breaking is exact
+    kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+    cand = np.flatnonzero(scores >= kth)
+    order = np.lexsort((ids[cand], -scores[cand]))
+    return cand[order[:top_k]]
+
+
+def score_rows(matrix: np.ndarray, q_vec: np.ndarray) -> np.ndarray:
+    """Inner product of every row with q_vec.
+
+    Both the single-process scan and the shard workers score through this
+    function. einsum reduces each row on its own, independent of where the row
+    sits in the array, whereas BLAS gemv takes different kernel and remainder
+    paths (and thread splits) depending on block offsets and can differ by an
+    ulp, which is enough to reorder near-ties.
+    """
+    q_vec = np.asarray(q_vec, dtype=matrix.dtype).ravel()
+    return np.einsum("ij,j->i", matrix, q_vec)
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+_worker_shards = {}
+
+_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def _attach_shards(specs, dim, dtype):
+    for shard_id, (name, start, rows) in enumerate(specs):
+        shm = SharedMemory(name=name)
+        matrix = np.ndarray((rows, dim), dtype=dtype, buffer=shm.buf)
+        _worker_shards[shard_id] = (shm, start, matrix)
+
+
+def _search_shard(shard_id, q_vec, top_k):
+    _, start, matrix = _worker_shards[shard_id]
+    sims = score_rows(matrix, q_vec)
+    local = top_k_indices(sims, top_k)
+    return local + start, sims[local]
+
+
+# -----------------------------
+# Sharded index
+# -----------------------------
+class ShardedDenseIndex:
+    """
+    Exact dense search over a row-partitioned embedding matrix.
+
+    Each shard is a contiguous block of rows copied into its own shared-memory
+    segment. A pool of worker processes maps the segments without copying,
+    scores the query against one shard per task and returns a local top-k;
+    the local results are merged into the global top-k.
+    """
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        num_shards: int = 4,
+        processes: int | None = None,
+        normalize: bool = False,
+    ):
+        """
+        embeddings: (rows, dim) array; a read-only np.memmap works and is only
+            paged in one shard at a time
+        normalize: L2-normalize rows while copying them into shared memory
+        """
+        if num_shards < 1:
+            raise ValueError(f"num_shards must be >= 1, got {num_shards}")
+
+        self.num_rows, self.dim = embeddings.shape
+        self.dtype = embeddings.dtype
+        self.requested_shards = num_shards
+        self.num_shards = min(num_shards, max(self.num_rows, 1))
+
+        self._segments = []
+        specs = []
+        bounds = np.linspace(0, self.num_rows, self.num_shards + 1).astype(int)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            rows = int(stop - start)
+            block = np.asarray(embeddings[start:stop])
+            if normalize:
+                block = block / norm(block, axis=1, keepdims=True)
+            shm = SharedMemory(create=True, size=max(rows * self.dim * self.dtype.itemsize, 1))
+            np.ndarray((rows, self.dim), dtype=self.dtype, buffer=shm.buf)[:] = block
+            self._segments.append(shm)
+            specs.append((shm.name, int(start), rows))
+
+        # One scanner per shard: keep each worker's BLAS/OpenMP pools single-threaded
+        # so N workers do not each spin up a thread per core. Spawned children
+        # copy the environment at start-up, so set it only around pool creation.
+        saved = {k: os.environ.get(k) for k in _THREAD_ENV}
+        os.environ.update({k: "1" for k in _THREAD_ENV})
+        try:
+            self._pool = get_context("spawn").Pool(
+                processes=processes or self.num_shards,
+                initializer=_attach_shards,
+                initargs=(specs, self.dim, self.dtype.str),
+            )
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+        atexit.register(self.close)
+
+    def search(self, q_vec: np.ndarray, top_k: int = 5):
+        """Return (indices, scores) of the top_k rows by inner product with q_vec."""
+        q_vec = np.asarray(q_vec, dtype=self.dtype).ravel()
+        parts = self._pool.starmap(
+            _search_shard,
+            [(shard_id, q_vec, top_k) for shard_id in range(self.num_shards)],
+        )
+
+        idxs = np.concatenate([p[0] for p in parts])
+        scores = np.concatenate([p[1] for p in parts])
+        best = top_k_indices(scores, top_k, ids=idxs)
+        return idxs[best], scores[best]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        for shm in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+if __name__ == "__main__":
+    # python -m indexing.dense [rows] [dim] [shards]
+    import sys
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    shards = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((rows, dim), dtype=np.float32)
+    emb /= norm(emb, axis=1, keepdims=True)
+    queries = rng.standard_normal((20, dim), dtype=np.float32)
+
+    def bench(fn):
+        fn(queries[0])
+        start = time.perf_counter()
+        for q in queries:
+            fn(q)
+        return (time.perf_counter() - start) / len(queries) * 1000
+
+    print(f"[INFO] {rows} x {dim}, {os.cpu_count()} CPUs")
+    print(f"single-process scan : {bench(lambda q: top_k_indices(score_rows(emb, q), 10)):.1f} ms/query")
+    with ShardedDenseIndex(emb, num_shards=shards) as index:
+        print(f"{index.num_shards} shards          : {bench(lambda q: index.search(q, 10)):.1f} ms/query")
@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 import numpy as np
 import torch
 from numpy.linalg import norm
@@ -17,6 +18,7 @@ except Exception:
     InferenceApi = None
 
 from reranking.cross_encoder import CrossEncoderReranker
+from indexing.dense import ShardedDenseIndex, score_rows, top_k_indices
 
 # -----------------------------
 # Paths
@@ -37,14 +39,47 @@ for c in chunks:
     if c.get("title"):
         doc_titles[c["doc_id"]] = c["title"]
 
-embeddings = np.load(EMBED_DIR / "embeddings.npy")
+EMBED_FILE = EMBED_DIR / "embeddings.npy"
 chunk_ids = json.load(open(EMBED_DIR / "chunk_ids.json"))
 
 # Map chunk_id → chunk
 id2chunk = {c["chunk_id"]: c for c in chunks}
 
-# Normalize embeddings for cosine similarity
-embeddings = embeddings / norm(embeddings, axis=1, keepdims=True)
+# Number of shared-memory shards for dense search (1 = single-process scan)
+DENSE_SHARDS = int(os.environ.get("DENSE_SHARDS", "1"))
+
+def load_embeddings() -> np.ndarray:
+    """Load the chunk embeddings, normalized for cosine similarity."""
+    emb = np.load(EMBED_FILE)
+    return emb / norm(emb, axis=1, keepdims=True)
+
+# When sharding, the normalized matrix lives only in the workers' shared memory;
+# the in-process copy is loaded on demand if a single-process scan is requested.
+embeddings = load_embeddings() if DENSE_SHARDS <= 1 else None
+_sharded_index = None
+_index_lock = threading.Lock()
+
+def get_embeddings() -> np.ndarray:
+    global embeddings
+    with _index_lock:
+        if embeddings is None:
+            embeddings = load_embeddings()
+        return embeddings
+
+def get_sharded_index(num_shards: int) -> ShardedDenseIndex:
+    """Return the process-wide sharded index, rebuilding it if the shard count changed."""
+    global _sharded_index
+    with _index_lock:
+        if _sharded_index is None or _sharded_index.requested_shards != num_shards:
+            if _sharded_index is not None:
+                _sharded_index.close()
+            # Build from a memmap so rows are paged in one shard at a time
+            _sharded_index = ShardedDenseIndex(
+                np.load(EMBED_FILE, mmap_mode="r"),
+                num_shards=num_shards,
+                normalize=True,
+            )
+        return _sharded_index
 
 # -----------------------------
 # Query embedding (local or remote)
@@ -55,6 +90,26 @@ HF_TOKEN = os.environ.get("HF_HUB_TOKEN")
 
 device = "mps" if torch.backends.mps.is_available() else "cpu"
 
+_embed_model = None
+_embed_model_lock = threading.Lock()
+
+def get_embed_model():
+    """Return the process-wide local SentenceTransformer, loading it once."""
+    global _embed_model
+    if SentenceTransformer is None:
+        raise RuntimeError("sentence-transformers not installed; install it or set USE_REMOTE_EMBED=1 to use remote embedding.")
+    with _embed_model_lock:
+        if _embed_model is None:
+            _embed_model = SentenceTransformer("all-MiniLM-L6-v2", device=device)
+        return _embed_model
+
+def get_remote_embed_client():
+    if InferenceApi is None:
+        raise RuntimeError("huggingface-hub not installed; cannot use remote embedding. Install huggingface-hub or disable USE_REMOTE_EMBED.")
+    if not HF_TOKEN:
+        raise RuntimeError("HF_HUB_TOKEN not found; set it in environment or .env to use remote embedding.")
+    return InferenceApi(repo_id=MODEL_NAME, token=HF_TOKEN, task="feature-extraction")
+
 def encode_query(query: str) -> np.ndarray:
     """Return a normalized embedding vector for the query.
 
@@ -62,11 +117,7 @@ def encode_query(query: str) -> np.ndarray:
     falls back to local SentenceTransformer.
     """
     if USE_REMOTE_EMBED:
-        if InferenceApi is None:
-            raise RuntimeError("huggingface-hub not installed; cannot use remote embedding. Install huggingface-hub or disable USE_REMOTE_EMBED.")
-        if not HF_TOKEN:
-            raise RuntimeError("HF_HUB_TOKEN not found; set it in environment or .env to use remote embedding.")
-        client = InferenceApi(repo_id=MODEL_NAME, token=HF_TOKEN, task="feature-extraction")
+        client = get_remote_embed_client()
         vec = client(inputs=query)
         v = np.array(vec, dtype=np.float32)
         if v.ndim == 2:
@@ -74,12 +125,34 @@ def encode_query(query: str) -> np.ndarray:
         v = v / norm(v)
         return v
     else:
-        if SentenceTransformer is None:
-            raise RuntimeError("sentence-transformers not installed; install it or set USE_REMOTE_EMBED=1 to use remote embedding.")
-        model = SentenceTransformer("all-MiniLM-L6-v2", device=device)
+        model = get_embed_model()
         q_vec = model.encode([query], convert_to_numpy=True)
         q_vec = q_vec / norm(q_vec)
         return q_vec.flatten()
+
+def encode_texts(texts: list, batch_size: int = 32) -> np.ndarray:
+    """Return normalized embeddings for a list of texts, shape (len(texts), dim).
+
+    Local mode encodes in batches with one loaded model; remote mode sends the
+    whole list in a single Inference API request.
+    """
+    if USE_REMOTE_EMBED:
+        vecs = get_remote_embed_client()(inputs=list(texts))
+        out = []
+        for vec in vecs:
+            v = np.array(vec, dtype=np.float32)
+            if v.ndim == 2:
+                v = v.mean(axis=0)
+            out.append(v)
+        out = np.vstack(out)
+        return out / norm(out, axis=1, keepdims=True)
+    else:
+        return get_embed_model().encode(
+            list(texts),
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
 # -----------------------------
 # Retrieval
 # -----------------------------
@@ -90,16 +163,22 @@ def resolve_title(chunk):
         or f"{chunk['source']}::{chunk['doc_id'][:8]}"
     )
 
-def retrieve(query, top_k=5, rerank=False, rerank_k=10):
+def retrieve(query, top_k=5, rerank=False, rerank_k=10, shards=None):
     q_vec = encode_query(query)
+    shards = DENSE_SHARDS if shards is None else shards
+
+    if shards > 1:
+        idxs, scores = get_sharded_index(shards).search(q_vec, top_k=top_k)
+    else:
+        sims = score_rows(get_embeddings(), q_vec)
+        idxs = top_k_indices(sims, top_k)
+        scores = sims[idxs]
 
-    sims = embeddings @ q_vec.T
-    idxs = sims.flatten().argsort()[::-1][:top_k]
     results = []
-    for i in idxs:
+    for i, score in zip(idxs, scores):
       chunk = id2chunk[chunk_ids[i]]
       results.append({
-          "score": float(sims[i]),
+          "score": float(score),
           "text": chunk["text"],
           "title": resolve_title(chunk),
           "source": chunk["source"],
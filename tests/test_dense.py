@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+
+from indexing.dense import ShardedDenseIndex, score_rows, top_k_indices
+
+
+@pytest.fixture(scope="module")
+def matrix():
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((2003, 32)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    # Exact duplicates so ties straddle shard boundaries
+    emb[10] = emb[1900]
+    emb[700] = emb[1900]
+    return emb
+
+
+def brute_force(emb, q_vec, top_k):
+    sims = score_rows(emb, q_vec)
+    idxs = top_k_indices(sims, top_k)
+    return idxs, sims[idxs]
+
+
+def test_top_k_indices_breaks_ties_by_id():
+    scores = np.array([0.5, 0.9, 0.5, 0.9, 0.1])
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 0]
+    assert top_k_indices(scores, 3, ids=np.array([9, 8, 7, 6, 5])).tolist() == [3, 1, 2]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 0, 2, 4]
+
+
+@pytest.mark.parametrize("num_shards", [2, 5])
+def test_sharded_search_matches_brute_force(matrix, num_shards):
+    rng = np.random.default_rng(1)
+    queries = [matrix[1900]] + [rng.standard_normal(32).astype(np.float32) for _ in range(10)]
+    with ShardedDenseIndex(matrix, num_shards=num_shards) as index:
+        for q_vec in queries:
+            for top_k in (1, 10, 50):
+                idxs, scores = index.search(q_vec, top_k=top_k)
+                ref_idxs, ref_scores = brute_force(matrix, q_vec, top_k)
+                np.testing.assert_array_equal(idxs, ref_idxs)
+                np.testing.assert_array_equal(scores, ref_scores)
+
+
+def test_normalizes_memmap_per_shard(matrix, tmp_path):
+    raw = matrix * np.linspace(0.5, 3.0, len(matrix), dtype=np.float32)[:, None]
+    np.save(tmp_path / "embeddings.npy", raw)
+    mm = np.load(tmp_path / "embeddings.npy", mmap_mode="r")
+    normalized = raw / np.linalg.norm(raw, axis=1, keepdims=True)
+
+    q_vec = matrix[42]
+    with ShardedDenseIndex(mm, num_shards=3, normalize=True) as index:
+        idxs, scores = index.search(q_vec, top_k=20)
+    ref_idxs, ref_scores = brute_force(normalized, q_vec, 20)
+    np.testing.assert_array_equal(idxs, ref_idxs)
+    np.testing.assert_array_equal(scores, ref_scores)
+
+
+def test_shard_count_clamped_to_rows(matrix):
+    with ShardedDenseIndex(matrix[:4], num_shards=20) as index:
+        assert index.num_shards == 4
+        assert index.requested_shards == 20
+        idxs, _ = index.search(matrix[2], top_k=10)
+        assert idxs.tolist() == brute_force(matrix[:4], matrix[2], 10)[0].tolist()
+
+
+def test_score_rows_independent_of_row_offset():
+    rng = np.random.default_rng(3)
+    emb = rng.standard_normal((1001, 383)).astype(np.float32)
+    q_vec = rng.standard_normal(383).astype(np.float32)
+    full = score_rows(emb, q_vec)
+    for start in (1, 2, 3, 5, 333):
+        np.testing.assert_array_equal(score_rows(emb[start:], q_vec), full[start:])
+        np.testing.assert_array_equal(score_rows(emb[start:].copy(), q_vec), full[start:])
+
+
+@pytest.mark.parametrize("num_shards", [3, 7, 13])
+def test_sharded_scores_bitwise_equal_at_full_width(num_shards):
+    rng = np.random.default_rng(4)
+    emb = rng.standard_normal((20011, 384)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    with ShardedDenseIndex(emb, num_shards=num_shards) as index:
+        for _ in range(20):
+            q_vec = rng.standard_normal(384).astype(np.float32)
+            idxs, scores = index.search(q_vec, top_k=25)
+            ref_idxs, ref_scores = brute_force(emb, q_vec, 25)
+            np.testing.assert_array_equal(idxs, ref_idxs)
+            np.testing.assert_array_equal(scores, ref_scores)
+
+
+def test_thread_env_restored_after_pool_start(matrix, monkeypatch):
+    monkeypatch.setenv("OMP_NUM_THREADS", "8")
+    monkeypatch.delenv("OPENBLAS_NUM_THREADS", raising=False)
+    with ShardedDenseIndex(matrix[:100], num_shards=2):
+        pass
+    assert os.environ["OMP_NUM_THREADS"] == "8"
+    assert "OPENBLAS_NUM_THREADS" not in os.environ
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from evaluation import generation_metrics as gm
+
+CHUNKS = [
+    {"text": "torch.autocast enables mixed precision", "title": "AMP", "source": "docs"},
+    {"text": "GradScaler scales the loss", "title": "AMP", "source": "docs"},
+]
+
+
+def fake_retrieve(query, top_k=5, rerank=False):
+    return list(CHUNKS)
+
+
+class FakeGenerator:
+    model_name = "fake/model"
+
+    def __init__(self, delay=0.0, fail=(), interrupt=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.interrupt = set(interrupt)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def generate(self, query, chunks, **kwargs):
+        with self.lock:
+            self.calls.append(query)
+        if query in self.interrupt:
+            raise KeyboardInterrupt
+        if query in self.fail:
+            raise ValueError("boom")
+        time.sleep(self.delay)
+        return {"prompt": "context " * 5, "answer": "Use torch.autocast [Source 1].", "model": self.model_name}
+
+
+def eval_set(n):
+    return [{"id": str(i), "query": f"q{i}", "reference_answer": "use torch.autocast"} for i in range(n)]
+
+
+def bag_of_words(texts):
+    out = np.zeros((len(texts), 128))
+    for i, t in enumerate(texts):
+        for w in gm.normalize_tokens(t):
+            out[i, hash(w) % 128] += 1
+    return out + 1e-6
+
+
+def test_token_f1_ignores_source_markers():
+    assert gm.token_f1("use torch.autocast [Source 1]", "use torch.autocast") == 1.0
+
+
+def test_only_records_without_chunks_are_none():
+    empty = {"answer": "", "chunks": CHUNKS}
+    no_chunks = {"answer": "Some answer.", "chunks": []}
+    scored = {"answer": "GradScaler scales the loss.", "chunks": CHUNKS}
+    faith = gm.faithfulness_scores([empty, no_chunks, scored], bag_of_words)
+    assert faith[:2] == [0.0, None] and faith[2] > 0.9
+    assert gm.faithfulness_scores([empty, no_chunks], bag_of_words) == [0.0, None]
+    assert gm.citation_coverage("", 3)["citation_coverage"] == 0.0
+    assert gm.citation_coverage("answer [Source 2] [Source 9]", 0)["citation_coverage"] is None
+    cov = gm.citation_coverage("answer [Source 2] [Source 9]", 4)
+    assert cov["citation_coverage"] == 0.25 and cov["invalid_citations"] == 1
+
+
+def test_faithfulness_scores_each_record_against_its_own_chunks():
+    other = [{"text": "completely unrelated distributed rpc text", "title": "RPC", "source": "docs"}]
+    recs = [
+        {"answer": "GradScaler scales the loss.", "chunks": CHUNKS},
+        {"answer": "GradScaler scales the loss.", "chunks": other},
+    ]
+    scores = gm.faithfulness_scores(recs, bag_of_words)
+    assert scores[0] == pytest.approx(1.0, abs=1e-4)
+    assert scores[1] < 0.5
+
+
+def test_load_eval_set_errors(tmp_path):
+    with pytest.raises(FileNotFoundError, match="reference_answer"):
+        gm.load_eval_set(tmp_path / "missing.json")
+    (tmp_path / "empty.json").write_text("")
+    with pytest.raises(ValueError, match="empty"):
+        gm.load_eval_set(tmp_path / "empty.json")
+    (tmp_path / "ok.json").write_text(json.dumps([{"query": "q", "reference_answer": "a"}]))
+    assert gm.load_eval_set(tmp_path / "ok.json") == [{"query": "q", "reference_answer": "a", "id": "0"}]
+
+
+def test_faithfulness_embeds_unique_texts_once():
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return bag_of_words(texts)
+
+    recs = [{"answer": "GradScaler scales the loss.", "chunks": CHUNKS} for _ in range(3)]
+    scores = gm.faithfulness_scores(recs, embed)
+    assert len(calls) == 1 and len(calls[0]) == len(set(calls[0])) == 3
+    assert scores[0] == pytest.approx(1.0, abs=1e-4)
+    assert scores[0] == scores[1] == scores[2]
+
+
+def test_resume_skips_checkpointed_and_retries_failures(tmp_path):
+    path = tmp_path / "run.jsonl"
+    gen = FakeGenerator(fail={"q1"})
+    recs = gm.run_generation_eval(eval_set(4), gen, path, retrieve_fn=fake_retrieve, max_concurrency=2)
+    assert [r["id"] for r in recs] == ["0", "2", "3"]
+
+    with open(path, "a") as f:
+        f.write('{"id": "partial')
+    gen = FakeGenerator()
+    recs = gm.run_generation_eval(eval_set(4), gen, path, retrieve_fn=fake_retrieve)
+    assert gen.calls == ["q1"]
+    assert [r["id"] for r in recs] == ["0", "1", "2", "3"]
+    assert recs[1]["token_counter"] in {"tiktoken:cl100k_base", "whitespace"}
+    assert [r["max_concurrency"] for r in recs] == [2, 4, 2, 2]
+    assert gm.summarize(recs)["max_concurrency"] == [2, 4]
+
+
+def test_todo_count_ignores_ids_outside_eval_set(tmp_path, capsys):
+    path = tmp_path / "run.jsonl"
+    gm.run_generation_eval(eval_set(4), FakeGenerator(), path, retrieve_fn=fake_retrieve)
+    capsys.readouterr()
+    gm.run_generation_eval(eval_set(2), FakeGenerator(), path, retrieve_fn=fake_retrieve)
+    assert "4 queries checkpointed, 0 to run" in capsys.readouterr().out
+
+
+def test_config_mismatch_refuses_to_resume(tmp_path):
+    path = tmp_path / "run.jsonl"
+    gm.run_generation_eval(eval_set(2), FakeGenerator(), path, retrieve_fn=fake_retrieve, top_k=5)
+    with pytest.raises(ValueError):
+        gm.run_generation_eval(eval_set(2), FakeGenerator(), path, retrieve_fn=fake_retrieve, top_k=10)
+
+    a = gm.run_config(FakeGenerator(), 5, False, 3, {"temperature": 0.0})
+    b = gm.run_config(FakeGenerator(), 5, False, 2, {"temperature": 0.0})
+    assert gm.checkpoint_path_for(a) != gm.checkpoint_path_for(b)
+
+
+def test_interrupt_keeps_finished_results_and_cancels_queue(tmp_path):
+    path = tmp_path / "run.jsonl"
+    gen = FakeGenerator(delay=0.05, interrupt={"q6"})
+    start = time.perf_counter()
+    with pytest.raises(KeyboardInterrupt):
+        gm.run_generation_eval(eval_set(40), gen, path, retrieve_fn=fake_retrieve, max_concurrency=2)
+    assert time.perf_counter() - start < 1.0
+    time.sleep(0.2)
+
+    saved = [json.loads(line)["id"] for line in open(path)]
+    assert len(gen.calls) <= 9
+    assert len(saved) >= 5 and "6" not in saved
+
+
+def test_generator_token_counts_preferred():
+    counts = gm._token_counts({"prompt": "a b", "answer": "c", "stats": {"prompt_tokens": 11, "new_tokens": 4}})
+    assert counts == {"prompt_tokens": 11, "answer_tokens": 4, "token_counter": "generator"}
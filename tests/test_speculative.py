@@ -0,0 +1,117 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from decoding.speculative import SpeculativeDecoder
+
+VOCAB = 64
+PROMPT_LEN = 7
+MAX_NEW = 30
+
+
+def tiny_gpt2(n_embd, n_layer, seed):
+    torch.manual_seed(seed)
+    config = transformers.GPT2Config(
+        vocab_size=VOCAB,
+        n_embd=n_embd,
+        n_layer=n_layer,
+        n_head=2,
+        n_positions=128,
+        bos_token_id=0,
+        eos_token_id=0,
+    )
+    return transformers.GPT2LMHeadModel(config).eval()
+
+
+@pytest.fixture(scope="module")
+def models():
+    return tiny_gpt2(32, 2, seed=0), tiny_gpt2(16, 1, seed=1)
+
+
+@pytest.fixture(scope="module")
+def prompt():
+    torch.manual_seed(2)
+    return torch.randint(1, VOCAB, (1, PROMPT_LEN))
+
+
+def greedy_baseline(model, input_ids, max_new_tokens):
+    """Plain greedy decoding without a cache: argmax over the full sequence each step."""
+    tokens = input_ids
+    with torch.inference_mode():
+        for _ in range(max_new_tokens):
+            next_id = model(tokens).logits[0, -1].argmax()
+            tokens = torch.cat([tokens, next_id.view(1, 1)], dim=1)
+    return tokens[0, input_ids.shape[1]:]
+
+
+@pytest.mark.parametrize("lookahead", [1, 3, 8])
+def test_greedy_matches_target(models, prompt, lookahead):
+    target, draft = models
+    out, stats = SpeculativeDecoder(target, draft).generate(
+        prompt, max_new_tokens=MAX_NEW, eos_token_id=None, lookahead=lookahead
+    )
+    assert torch.equal(out, greedy_baseline(target, prompt, MAX_NEW))
+    assert stats["new_tokens"] == MAX_NEW
+    assert stats["proposed_tokens"] > 0
+
+
+def test_lookahead_zero_is_plain_decoding(models, prompt):
+    target, draft = models
+    out, stats = SpeculativeDecoder(target, draft).generate(
+        prompt, max_new_tokens=MAX_NEW, eos_token_id=None, lookahead=0
+    )
+    assert torch.equal(out, greedy_baseline(target, prompt, MAX_NEW))
+    assert stats["draft_forward_passes"] == 0
+    assert stats["target_forward_passes"] == MAX_NEW
+
+
+def test_self_draft_accepts_everything(models, prompt):
+    target, _ = models
+    out, stats = SpeculativeDecoder(target, target, lookahead=4).generate(
+        prompt, max_new_tokens=MAX_NEW, eos_token_id=None
+    )
+    assert torch.equal(out, greedy_baseline(target, prompt, MAX_NEW))
+    assert stats["acceptance_rate"] == 1.0
+    assert stats["target_forward_passes"] < MAX_NEW
+
+
+def test_self_draft_accepts_everything_when_sampling(models, prompt):
+    target, _ = models
+    gen = torch.Generator().manual_seed(0)
+    _, stats = SpeculativeDecoder(target, target, lookahead=4).generate(
+        prompt, max_new_tokens=MAX_NEW, temperature=1.0, eos_token_id=None, generator=gen
+    )
+    assert stats["acceptance_rate"] == 1.0
+
+
+def test_negative_lookahead_rejected(models, prompt):
+    target, draft = models
+    with pytest.raises(ValueError):
+        SpeculativeDecoder(target, draft, lookahead=-1)
+    with pytest.raises(ValueError):
+        SpeculativeDecoder(target, draft).generate(prompt, max_new_tokens=5, lookahead=-2)
+
+
+class SizedTokenizer:
+    eos_token_id = None
+
+    def __init__(self, size):
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+
+def test_vocab_mismatch_requires_padding(models):
+    target, _ = models
+    padded_draft = tiny_gpt2(16, 1, seed=3)
+    padded_draft.resize_token_embeddings(VOCAB + 8)
+
+    with pytest.raises(ValueError):
+        SpeculativeDecoder(target, padded_draft)
+    with pytest.raises(ValueError):
+        SpeculativeDecoder(target, padded_draft, tokenizer=SizedTokenizer(VOCAB + 1))
+
+    decoder = SpeculativeDecoder(target, padded_draft, tokenizer=SizedTokenizer(VOCAB))
+    assert decoder.vocab_size == VOCAB